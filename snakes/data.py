@@ -149,6 +149,22 @@ class MultiSet (hdict) :
         result = MultiSet()
         result.update(self)
         return result
+    # apidoc skip
+    def __reduce__ (self) :
+        """Pickle support, `MultiSet.items` cannot be used for this
+        since it repeats values instead of pairing them with their
+        multiplicities.
+
+        >>> import pickle
+        >>> m = MultiSet([1, 2, 3, 1, 2])
+        >>> all(pickle.loads(pickle.dumps(m, p)) == m
+        ...     for p in range(pickle.HIGHEST_PROTOCOL + 1))
+        True
+        >>> c = pickle.loads(pickle.dumps(m, pickle.HIGHEST_PROTOCOL))
+        >>> c.__class__.__name__, c(1), c(2), c(3)
+        ('MultiSet', 2, 2, 1)
+        """
+        return self.__class__, (), None, None, iter(dict.items(self))
     __pnmltag__ = "multiset"
     # apidoc skip
     def __pnmldump__ (self) :
@@ -166,6 +166,46 @@ def rename (expr, map={}, **ren) :
 
 # apidoc skip
 class Binder (Renamer) :
+    _comp = {"ListComp" : ("elt",),
+             "SetComp" : ("elt",),
+             "DictComp" : ("key", "value")}
+    def visit (self, node) :
+        # iterative version of the recursive transformation, Name
+        # nodes are replaced in their parents and the replacements
+        # are not visited; nodes are matched by class name (as
+        # NodeTransformer does) to handle the SNAKES asdl classes
+        if not self.map[-1] :
+            return node
+        elif node.__class__.__name__ == "Name" :
+            return self.visit_Name(node)
+        stack = [(node, self.map[-1])]
+        while stack :
+            parent, bind = stack.pop()
+            fields = self._comp.get(parent.__class__.__name__, None)
+            if fields is not None :
+                bind = bind.copy()
+                for comp in parent.generators :
+                    for name in getvars(comp.target) :
+                        bind.pop(name, None)
+                if not bind :
+                    continue
+            else :
+                fields = parent._fields
+            for name in fields :
+                value = getattr(parent, name, None)
+                if isinstance(value, list) :
+                    for pos, child in enumerate(value) :
+                        if child.__class__.__name__ == "Name" :
+                            if child.id in bind :
+                                value[pos] = bind[child.id]
+                        elif isinstance(child, ast.AST) :
+                            stack.append((child, bind))
+                elif value.__class__.__name__ == "Name" :
+                    if value.id in bind :
+                        setattr(parent, name, bind[value.id])
+                elif isinstance(value, ast.AST) :
+                    stack.append((value, bind))
+        return node
     def visit_Name (self, node) :
         if node.id in self.map[-1] :
             return self.map[-1][node.id]
@@ -186,6 +226,15 @@ def bind (expr, map={}, **ren) :
     >>> bind('[x+y for x in range(3)]', y=ast.Num(n=2))
     '[(x + 2) for x in range(3)]'
 
+    Trees built by the SNAKES parsers use their own node classes,
+    they are handled as well.
+
+    >>> from snakes.lang.ctlstar import asdl
+    >>> bind(asdl.BinOp(left=asdl.Name(id='v', ctx=asdl.Load()),
+    ...                 op=asdl.Add(), right=asdl.Num(n=1)),
+    ...      v=asdl.Num(n=2))
+    '(2 + 1)'
+
     @param expr: a Python expression
     @type expr: `str`
     @param map: a mapping from old to new names (`str` to `ast.AST`)
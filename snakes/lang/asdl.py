@@ -296,5 +296,5 @@ if __name__ == "__main__":
         msg = "[E] {!s}".format(cycle)
         outfile.write(msg)
         if outfile != sys.stdout:
-            print >> sys.stderr, msg
+            sys.stderr.write(msg + "\n")
     outfile.close()
@@ -858,7 +858,14 @@ class Expression (ArcAnnotation) :
         self.globals = Evaluator()
     def copy (self) :
         "Return a copy of the expression."
-        return self.__class__(self._str)
+        # compiled code objects are immutable so the copy shares it
+        # instead of compiling the source again (eg, copies of a net)
+        result = self.__class__.__new__(self.__class__)
+        result._expr = self._expr
+        result._str = self._str
+        result._true = self._true
+        result.globals = Evaluator()
+        return result
     __pnmltag__ = "expression"
     # apidoc skip
     def __pnmldump__ (self) :
@@ -152,6 +152,29 @@ class Graph (Cluster) :
                 stdout = "\n*** Original error message follows ***\n " + stdout
             raise IOError("%s exited with status %s%s"
                           % (engine, dot.returncode, stdout))
+    def pipe (self, format, engine=None) :
+        "Render the graph in `format` and return the output as text"
+        if engine is None :
+            engine = getattr(self, "engine", "dot")
+        if engine not in ("dot", "neato", "twopi", "circo", "fdp") :
+            raise ValueError("unknown GraphViz engine %r" % engine)
+        dot = subprocess.Popen([engine, "-T" + format],
+                               stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+        if PY3 :
+            out, err = dot.communicate(bytes(self.dot(),
+                                             snakes.defaultencoding))
+            err = err.decode(snakes.defaultencoding)
+        else :
+            out, err = dot.communicate(self.dot())
+        if dot.returncode != 0 :
+            if err.strip() :
+                err = "\n*** Original error message follows ***\n " + err
+            raise IOError("%s exited with status %s%s"
+                          % (engine, dot.returncode, err))
+        # GraphViz text outputs (in particular SVG) are UTF-8 encoded
+        return out.decode("utf-8")
     def layout (self, engine="dot", debug=False) :
         if engine not in ("dot", "neato", "twopi", "circo", "fdp") :
             raise ValueError("unknown GraphViz engine %r" % engine)
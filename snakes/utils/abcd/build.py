@@ -7,6 +7,11 @@ from snakes.data import MultiSet
 from snakes import *
 from snakes.compat import *
 
+try :
+    builtins = sys.modules["__builtin__"]
+except KeyError :
+    builtins = sys.modules["builtins"]
+
 class Decl (object) :
     OBJECT = "object"
     TYPE = "type"
@@ -580,8 +585,8 @@ class Builder (object) :
                 return self.snk.Instance(obj)
             elif inspect.isroutine(obj) :
                 return self.snk.TypeCheck(obj)
-        elif hasattr(sys.modules["__builtin__"], name) :
-            obj = getattr(sys.modules["__builtin__"], name)
+        elif hasattr(builtins, name) :
+            obj = getattr(builtins, name)
             if inspect.isclass(obj) :
                 return self.snk.Instance(obj)
             elif inspect.isroutine(obj) :
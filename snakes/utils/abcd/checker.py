@@ -7,6 +7,7 @@ class Checker (object) :
     def __init__ (self, net, progress) :
         self.p = progress
         self.g = StateGraph(net)
+        self.s = {}
         self.f = [self.build(f) for f in net.label("asserts")]
         if progress :
             if len(self.f) == 0 :
@@ -36,21 +37,34 @@ def check (_) :
     def run (self) :
         start = last = time.time()
         for state in self.g :
-            marking = self.g.net.get_marking()
-            for place in marking :
-                if max(marking(place).values()) > 1 :
+            # check places in the net directly so that no marking is
+            # built unless some assertion needs it
+            for place in self.g.net.place() :
+                if place.tokens and max(place.tokens.values()) > 1 :
                     return len(self.g), None, self.trace(state)
-            for check in self.f :
-                try :
-                    if not check(marking) :
-                        return len(self.g), check.lineno, self.trace(state)
-                except :
-                    pass
+            if self.f :
+                marking = self.g.net.get_marking()
+                for check in self.f :
+                    try :
+                        if not check(marking) :
+                            return len(self.g), check.lineno, self.trace(state)
+                    except :
+                        pass
             if self.p and time.time() - last >= 5 :
                 last = time.time()
                 print(" ... %s states explored so far in %.0f seconds"
                       % (len(self.g), last - start))
         return len(self.g), None, None
+    def successors (self, state) :
+        # successors are computed once and shared by path and trace
+        try :
+            return self.s[state]
+        except KeyError :
+            succ = self.s[state] = {}
+            for target, trans, mode in self.g.successors(state) :
+                if target not in succ :
+                    succ[target] = (trans, mode)
+            return succ
     def path (self, tgt, src=0) :
         q = [(0, src, ())]
         visited = set()
@@ -61,10 +75,10 @@ def check (_) :
                 if v1 == tgt :
                     return path
                 visited.add(v1)
-                for v2 in self.g.successors(v1) :
+                for v2 in self.successors(v1) :
                     if v2 not in visited :
                         heapq.heappush(q, (c+1, v2, path))
     def trace (self, state) :
         path = self.path(state)
-        return tuple(self.g.successors(i)[j]
+        return tuple(self.successors(i)[j]
                      for i, j in zip(path[:-1], path[1:]))
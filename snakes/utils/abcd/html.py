@@ -1,6 +1,5 @@
-from snakes.compat import io
 from snakes.lang.abcd.parser import ast, parse
-import os, tempfile, re, codecs, collections
+import os, re, codecs, collections
 try :
     from cgi import escape
 except :
@@ -129,12 +128,31 @@ jQuery(document).ready(function() {
 </script>'''
 
 class Span (object) :
+    __slots__ = ("cls", "id", "net", "abcd", "tree", "_span")
     def __init__ (self, cls=[], id=None, net=[], abcd=[], tree=[]) :
         self.cls = set([cls]) if isinstance(cls, str) else set(cls)
         self.id = id
         self.net = set([net]) if isinstance(net, str) else set(net)
         self.abcd = set([abcd]) if isinstance(abcd, str) else set(abcd)
         self.tree = set([tree]) if isinstance(tree, str) else set(tree)
+        self._span = None
+    @classmethod
+    def fast (klass, cls, id=None, net=(), abcd=(), tree=()) :
+        """Build a span whose `cls` is a single string and other set
+        attributes are collections, bypassing type checks in `__init__`
+        """
+        span = klass.__new__(klass)
+        span.cls = set([cls])
+        span.id = id
+        span.net = set(net)
+        span.abcd = set(abcd)
+        span.tree = set(tree)
+        span._span = None
+        return span
+    def add (self, attr, value) :
+        "Add `value` to set attribute `attr`, rendering is updated"
+        getattr(self, attr).add(value)
+        self._span = None
     def copy (self, **attr) :
         span = self.__class__(cls=self.cls, id=self.id, net=self.net,
                               abcd=self.abcd, tree=self.tree)
@@ -142,6 +160,7 @@ class Span (object) :
             if isinstance(getattr(span, k), set) :
                 v = set(v)
             setattr(span, k, v)
+        span._span = None
         return span
     def __bool__ (self) :
         return self.__nonzero__()
@@ -149,7 +168,10 @@ class Span (object) :
         return bool(self.cls or self.id or self.net or self.abcd
                     or self.tree)
     def span (self) :
-        attr = []
+        if self._span is not None :
+            return self._span
+        # ids and classes never contain quotes so no repr() is needed
+        parts = ["<span"]
         for src, dst in (("cls", "class"), ("id", "id"),
                          ("net", "data-net"), ("abcd", "data-abcd"),
                          ("tree", "data-tree")) :
@@ -157,25 +179,47 @@ class Span (object) :
             if not val :
                 continue
             elif isinstance(val, str) :
-                attr.append("%s=%r" % (dst, val))
+                parts.append(" %s='%s'" % (dst, val))
             elif dst.startswith("data-") :
-                attr.append("%s=%r" % (dst, ", ".join("#" + v for v in val)))
+                parts.append(" %s='%s'"
+                             % (dst, ", ".join("#" + v for v in val)))
             else :
-                attr.append("%s=%r" % (dst, ", ".join(val)))
-        return "<span %s>" % " ".join(attr)
+                parts.append(" %s='%s'" % (dst, ", ".join(val)))
+        parts.append(">")
+        self._span = "".join(parts)
+        return self._span
     def __str__ (self) :
         return self.span()
 
-keywords = {"False", "True", "and", "as", "assert", "buffer", "const",
-            "else", "enum", "for", "from", "if", "import", "in", "is",
-            "lambda", "net", "not", "or", "symbol", "task", "typedef"}
+keywords = frozenset(["False", "True", "and", "as", "assert", "buffer",
+                      "const", "else", "enum", "for", "from", "if",
+                      "import", "in", "is", "lambda", "net", "not", "or",
+                      "symbol", "task", "typedef"])
+
+# spans for keywords, identifiers and other special tokens are never
+# changed after creation so one instance per class is shared, as well
+# as the empty span standing for nodes without one
+_nospan = Span()
+_kwspan = Span.fast("kw")
+_identspan = Span.fast("ident")
+_tokenspan = {"STRING" : Span.fast("string"),
+              "COLON" : _kwspan}
+
+_comment = re.compile(r"#[^\n]*\n?")
+
+def _descend (st, symbol) :
+    "Follow the first children of `st` down to the `symbol` node"
+    while st.symbol != symbol :
+        st = st[0]
+    return st
 
 class ABCD2HTML (ast.NodeVisitor) :
     def __init__ (self, tree) :
         self.tree = tree
         self.x = "%%0%uX" % len("%x" % (tree.st.erow + 1))
         self.st = {}
-        self.path = []
+        # stack of dotted prefixes of the enclosing nets
+        self.path = [""]
         self.nets = {}
         self.visit(tree)
     def __getitem__ (self, id) :
@@ -199,49 +243,42 @@ class ABCD2HTML (ast.NodeVisitor) :
             x, y = node.srow, node.scol
             ident = self.newid(cls, x, y)
             ident = args.pop("id", ident)
-            span = node.span = Span(cls=cls.lower(), id=ident, **args)
+            span = node.span = Span.fast(cls.lower(), id=ident, **args)
             self.st[ident] = node
         elif node is None :
-            span = Span(cls=cls.lower(), **args)
+            span = Span.fast(cls.lower(), **args)
             if "id" in args :
                 self.st[args["id"]] = span
         else :
-            span = node.span = Span(cls=cls.lower(), **args)
+            span = node.span = Span.fast(cls.lower(), **args)
             if "id" in args :
                 self.st[args["id"]] = node
         return span
     def visit_AbcdBuffer (self, node) :
-        t = node.st
-        while t.symbol != "abcd_buffer" :
-            t = t[0]
+        t = _descend(node.st, "abcd_buffer")
         self.setspan("decl", t[1])
         self.setspan("buffer", node)
         self.generic_visit(node)
     def visit_AbcdNet (self, node) :
-        t = node.st
-        while t.symbol != "abcd_net" :
-            t = t[0]
+        t = _descend(node.st, "abcd_net")
         self.setspan("decl", t[1])
         self.setspan("body", node.body)
         span = self.setspan("net", node)
         self.setspan("proto", None, id="P" + span.id)
-        self.nets[".".join(self.path + [node.name])] = span.id
-        self.path.append(node.name)
+        name = self.path[-1] + node.name
+        self.nets[name] = span.id
+        self.path.append(name + ".")
         self.generic_visit(node)
         self.path.pop(-1)
     def visit_AbcdInstance (self, node) :
-        t = node.st
-        while t.symbol != "abcd_instance" :
-            t = t[0]
+        t = _descend(node.st, "abcd_instance")
         self.setspan("name", t[0])
-        pid = "P" + self.nets[".".join(self.path + [node.net])]
+        pid = "P" + self.nets[self.path[-1] + node.net]
         span = self.setspan("instance", node, abcd=[pid])
-        self[pid].abcd.add(span.id)
+        self[pid].add("abcd", span.id)
         self.generic_visit(node)
     def visit_AbcdAction (self, node) :
-        t = node.st
-        while t[0].text != '[' :
-            t = t[0]
+        t = _descend(node.st, "abcd_action")
         span = self.setspan("action", node)
         self.setspan("delim", t[0], id="L" + span.id)
         self.setspan("delim", t[-1], id="R" + span.id)
@@ -263,40 +300,49 @@ class ABCD2HTML (ast.NodeVisitor) :
         self.visit_SimpleAccess(node)
     def visit_SwapAccess (self, node) :
         self.visit_SimpleAccess(node)
-    def escape (self, text) :
-        return escape(text)
+    # html.escape already beats str.translate on the short tokens that
+    # make most of the source, so it is used directly as a method
+    escape = staticmethod(escape)
     def build (self, st) :
         # collect text skipped during parsing (blanks and comments)
-        output = io.StringIO()
+        skipped = []
+        lines = self.lines
         if st.srow > self.row :
-            for line in st.text.lexer.lines[self.row-1:st.srow-1] :
-                output.write(line[self.col:])
+            for line in lines[self.row-1:st.srow-1] :
+                skipped.append(line[self.col:])
                 self.col = 0
-            output.write(st.text.lexer.lines[st.srow-1][:st.scol])
+            skipped.append(lines[st.srow-1][:st.scol])
         elif st.scol > self.col :
-            output.write(st.text.lexer.lines[self.row-1][self.col:st.scol])
+            skipped.append(lines[self.row-1][self.col:st.scol])
         # insert skipped text with comments rendering
-        for line in output.getvalue().splitlines(True) :
-            if "#" in line :
-                left, right = line.split("#", 1)
-                self.output.write("%s<span class=%r>%s</span>"
-                                  % (self.escape(left),
-                                     "comment",
-                                     self.escape("#" + right)))
-            else :
-                self.output.write(self.escape(line))
+        escape = self.escape
+        text = "".join(skipped)
+        pos = 0
+        for match in _comment.finditer(text) :
+            self.output.append("%s<span class='comment'>%s</span>"
+                               % (escape(text[pos:match.start()]),
+                                  escape(match.group())))
+            pos = match.end()
+        if pos < len(text) :
+            self.output.append(escape(text[pos:]))
+        # plain tokens without span are just copied
+        if not len(st) and not hasattr(st, "span") :
+            if st.symbol not in ("DEDENT", "ENDMARKER") :
+                self.output.append(escape(st.text))
+            self.row, self.col = st.erow, st.ecol
+            return
         # adjust current position in source code
         self.row, self.col = st.srow, st.scol
         # close span for net declaration
-        span = getattr(st, "span", Span())
+        span = getattr(st, "span", _nospan)
         if "body" in (c.lower() for c in span.cls) :
-            self.output.write("</span>")
+            self.output.append("</span>")
         # generate <span ...> if necessary
         if span :
-            self.output.write(str(span))
+            self.output.append(str(span))
         # generate span for net declaration
         if (span.id or "").startswith("N") :
-            self.output.write(str(self["P" + span.id]))
+            self.output.append(str(self["P" + span.id]))
         # render tree or its children
         if len(st) :
             for child in st :
@@ -304,31 +350,32 @@ class ABCD2HTML (ast.NodeVisitor) :
                 if not hasattr(child, "span") :
                     if child.symbol == "NAME" :
                         if child.text in keywords :
-                            self.setspan("kw", child)
+                            child.span = _kwspan
                         else :
-                            self.setspan("ident", child)
-                    elif child.symbol == "STRING" :
-                        self.setspan("string", child)
-                    elif child.symbol == "COLON" :
-                        self.setspan("kw", child)
+                            child.span = _identspan
+                    elif child.symbol in _tokenspan :
+                        child.span = _tokenspan[child.symbol]
                 self.build(child)
         else :
             if st.symbol not in ("DEDENT", "ENDMARKER") :
-                self.output.write(self.escape(st.text))
+                self.output.append(self.escape(st.text))
             self.row, self.col = st.erow, st.ecol
         # generate </span> if necessary
         if span :
-            self.output.write("</span>")
+            self.output.append("</span>")
     def html (self) :
-        self.output = io.StringIO()
+        # output is collected as a list of strings joined once at the end
+        self.output = []
+        self.lines = self.tree.st.text.lexer.lines
         self.indent, self.row, self.col = False, 1, 0
         self.build(self.tree.st)
-        return "<pre class='abcd'>%s</pre>" % self.output.getvalue()
+        return "<pre class='abcd'>%s</pre>" % "".join(self.output)
 
 def Tree () :
     return collections.defaultdict(Tree)
 
 class TreeInfo (object) :
+    __slots__ = ("span", "name")
     def __init__ (self, span, name) :
         self.span, self.name = span, name
     def __hash__ (self) :
@@ -344,11 +391,17 @@ class TreeInfo (object) :
         yield self.span
         yield self.name
 
-_svgclean = [(re.compile(r, re.I), s) for r, s in
-             [(r"<[?!][^>]*>\n*", ""),
-              (r"<title>[^<>]*</title>\n*", ""),
-              (r"<g [^<>]*></g>\n*", ""),
-              ]]
+# removes XML/DOCTYPE headers, titles and groups left empty without them
+_svgclean = re.compile(r"<[?!][^>]*>\n*"
+                       r"|<title>[^<>]*</title>\n*"
+                       r"|<g [^<>]*>(?:<title>[^<>]*</title>\n*)?</g>\n*",
+                       re.I)
+_svgid = re.compile(r' id="([^"]*)" ')
+
+_treebuffer = ("<li>%s<span class='kw'>buffer</span> "
+               "<span class='name'>%s</span> = "
+               "<span class='content'>%s</span></span></li>")
+_treeaction = "<li>%s%s</span><ul class='modes'></ul></li>"
 
 class Net2HTML (object) :
     def __init__ (self, net, gv, abcd) :
@@ -358,7 +411,7 @@ class Net2HTML (object) :
         self.n2a = collections.defaultdict(set)
         self.n2t = {}
         snk = net.label("snakes")
-        self.count = collections.defaultdict(int)
+        self.count = {}
         for place in net.place() :
             nid = gv.nodemap[place.name]
             if place.status in (snk.entry, snk.internal, snk.exit) :
@@ -372,14 +425,17 @@ class Net2HTML (object) :
                 self.addtree(0, "buffer", place)
         for trans in net.transition() :
             self.addtree(10, "action", trans)
+    def _treeid (self, ident) :
+        num = self.count.get(ident, 0)
+        self.count[ident] = num + 1
+        return "T%X%s" % (num, ident)
     def addtree (self, weight, kind, node) :
         nid = self.gv.nodemap[node.name]
         aid = self.abcd[node]
-        tid = aid.copy(id=("T%X" % self.count[aid.id]) + aid.id,
+        tid = aid.copy(id=self._treeid(aid.id),
                        tree=[], abcd=[aid.id], net=[nid])
-        self.count[aid.id] += 1
-        aid.tree.add(tid.id)
-        aid.net.add(nid)
+        aid.add("tree", tid.id)
+        aid.add("net", nid)
         self.n2a[nid].add(aid.id)
         self.n2t[nid] = tid.id
         pos = self.tree
@@ -388,58 +444,56 @@ class Net2HTML (object) :
             inst = node.label("instances")
         except :
             inst = [None] * len(path)
+        abcd, treeid = self.abcd, self._treeid
         for name, (_, srow, scol, _, _) in zip(path, inst) :
-            a = self.abcd["I", srow, scol]
-            t = a.copy(id=("T%X" % self.count[a.id]) + a.id,
+            a = abcd["I", srow, scol]
+            t = a.copy(id=treeid(a.id),
                        tree=[], abcd=[a.id], net=[])
-            self.count[a.id] += 1
-            a.tree.add(t.id)
+            a.add("tree", t.id)
             pos = pos[((20, srow, scol), "instance", TreeInfo(t, name))]
         prefix = sum(len(p) for p in path) + len(path)
         srow, scol, _, _ = node.label("srcloc")
         pos[((weight, srow, scol), kind, (node, node.name[prefix:]))] = tid
-    def _tree (self, tree, indent="") :
-        yield indent + "<ul>"
-        for (_, kind, data), child in sorted(tree.items()) :
-            if kind == "instance" :
-                yield indent + "<li>%s%s</span>" % tuple(data)
-                for item in self._tree(child, indent + "  ") :
-                    yield item
-                yield indent + "</li>"
-            else :
+    def _tree (self, tree, out, indent="") :
+        append = out.append
+        append(indent + "<ul>")
+        stack = [(indent, iter(sorted(tree.items())))]
+        while stack :
+            indent, items = stack[-1]
+            for (_, kind, data), child in items :
+                if kind == "instance" :
+                    append(indent + "<li>%s%s</span>" % tuple(data))
+                    append(indent + "  <ul>")
+                    stack.append((indent + "  ", iter(sorted(child.items()))))
+                    break
                 node, name = data
                 if kind == "buffer" :
-                    content = ("<span class='kw'>buffer</span> "
-                               "<span class='name'>%s</span> = "
-                               "<span class='content'>%s</span>"
-                               % (name, node.tokens))
-                    yield indent + "<li>%s%s</span></li>" % (child, content)
+                    append(indent + _treebuffer % (child, name, node.tokens))
                 elif kind == "action" :
-                    content = name
-                    yield (indent + "<li>%s%s</span><ul class='modes'>"
-                           + "</ul></li>") % (child, content)
+                    append(indent + _treeaction % (child, name))
                 else :
                     raise ValueError("unexpected data %r" % kind)
-        yield indent + "</ul>"
+            else :
+                # all the items at this level are done
+                stack.pop(-1)
+                append(indent + "</ul>")
+                if stack :
+                    append(stack[-1][0] + "</li>")
+        return out
     def html (self) :
-        return template_tree % {"tree" : "\n".join(self._tree(self.tree))}
+        return template_tree % {"tree" : "\n".join(self._tree(self.tree, []))}
     def svg (self) :
-        # load SVG file
-        with tempfile.NamedTemporaryFile(suffix=".svg") as tmp :
-            self.gv.render(tmp.name)
-            with codecs.open(tmp.name, "r", "utf-8") as infile :
-                svg = infile.read()
-        for r, s in _svgclean :
-            svg = r.sub(s, svg)
+        svg = self.gv.pipe("svg")
+        svg = _svgclean.sub("", svg)
+        attrs = {}
         for node, abcd in self.n2a.items() :
             abcd = ", ".join("#" + t for t in abcd)
             if node in self.n2t :
-                svg = svg.replace(' id="%s" ' % node,
-                                  ' id="%s" data-abcd="%s" data-tree="#%s" '
-                                  % (node, abcd, self.n2t[node]))
+                attrs[node] = (' id="%s" data-abcd="%s" data-tree="#%s" '
+                               % (node, abcd, self.n2t[node]))
             else :
-                svg = svg.replace(' id="%s" ' % node,
-                                  ' id="%s" data-abcd="%s" ' % (node, abcd))
+                attrs[node] = ' id="%s" data-abcd="%s" ' % (node, abcd)
+        svg = _svgid.sub(lambda m : attrs.get(m.group(1), m.group()), svg)
         return u"<div class='petrinet'>%s</div>" % svg
 
 def build (abcd, node, net, gv, outfile, tpl=template_html, **args) :
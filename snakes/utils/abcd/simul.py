@@ -48,8 +48,9 @@ class ABCDSimulator (BaseSimulator) :
         return help
     def getstate (self, state) :
         marking = self.states[state]
+        enabled = self.states.modes(state)
         modes = dict((t, []) for t in self.transid)
-        for i, (trans, mode) in enumerate(marking.modes) :
+        for i, (trans, mode) in enumerate(enabled) :
             modes[self.tree[trans.name]].append({"state" : state,
                                                  "mode" : i,
                                                  "html" : str(mode)})
@@ -60,10 +61,10 @@ class ABCDSimulator (BaseSimulator) :
                   "class" : "active"}]
                 + [{"do" : "addclass",
                     "select" : self.abcd[trans.name],
-                    "class" : "active"} for trans, mode in marking.modes]
+                    "class" : "active"} for trans, mode in enabled]
                 + [{"do" : "addclass",
                     "select" : self.tree[trans.name],
-                    "class" : "active"} for trans, mode in marking.modes]
+                    "class" : "active"} for trans, mode in enabled]
                 + [{"do" : "settext",
                     "select" : "%s .content" % self.tree[place],
                     "text" : "{}"} for place in self.places
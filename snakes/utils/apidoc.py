@@ -4,7 +4,8 @@ Python module and a command-line tool:
 
     :::console
     $ python -m snakes.utils.apidoc
-    [error] Usage: python -m snakes.utils.apidoc TARGET [EXCLUDE...]
+    [error] Usage: python -m snakes.utils.apidoc [--jobs=N] TARGET [EXCLUDE...]
+            N        number of worker processes (default: 1)
             TARGET   target directory to write files
             EXCLUDE  pattern to exclude modules (not file names)
     $ python -m snakes.utils.apidoc api snakes.lang.*
@@ -53,14 +54,16 @@ at SNAKES source code. However, let's note a few points:
 
 import sys, os, os.path, codecs
 import inspect, fnmatch, re, shlex
-import textwrap, doctest
+import textwrap, doctest, tokenize, ast, multiprocessing
 import snakes
-from snakes.lang.python.parser import parse, ast
+
+# imported on first use by DocExtract.md
+markdown = False
 
 try :
-    import markdown
-except :
-    markdown = None
+    from os import scandir
+except ImportError :
+    scandir = None
 
 ##
 ## console messages
@@ -135,10 +138,23 @@ class DocExtract (object) :
         self.path = inpath.rstrip(os.sep)
         self.outpath = outpath
         self.out = None
+        self.outfile = None
         self.exclude = exclude
+        if exclude :
+            self._exclude = re.compile("|".join("(?:%s)" % fnmatch.translate(g)
+                                                for g in exclude))
+        else :
+            self._exclude = None
         self.inputenc = inputenc
         self.outputenc = outputenc
-        self._last = "\n\n"
+        self.lines = []
+        self.directives = {}
+        self._visitors = {}
+        self._wrappers = {}
+        self._cleaned = {}
+        self._parsed = {}
+        self._newlines = 2
+    _markdown = None
     def md (self, text, inline=True) :
         """Return the Markdow rendering of `text`, include `<p>` if
         `inline` is `False`. If Python Markdown module is not
@@ -152,16 +168,26 @@ class DocExtract (object) :
         @return: HTML text
         @rtype: `str`
         """
+        global markdown
+        if markdown is False :
+            try :
+                import markdown
+            except :
+                markdown = None
         if markdown is None :
             return text
-        elif inline :
-            return re.sub("</?p>", "\n", markdown.markdown(text), re.I)
+        if self._markdown is None :
+            self._markdown = markdown.Markdown()
+        html = self._markdown.convert(text)
+        self._markdown.reset()
+        if inline :
+            return re.sub("</?p>", "\n", html, re.I)
         else :
-            return markdown.markdown(text)
+            return html
     def openout (self, path) :
-        """Open in `self.out` the output file where the conversion of
+        """Prepare in `self.out` the buffer where the conversion of
         input file `path` will be rendered. If `self.out` is already
-        opened, it is first closed.
+        in use, it is first flushed to its output file.
 
         Return a Boolean indicating if `path` should be ignored, in
         which case the output file is not opened. This occurs either
@@ -177,8 +203,7 @@ class DocExtract (object) :
             files called `index.md` so that when converted to HTML,
             this will yield a file called `index.html`
         """
-        if self.out is not None :
-            self.out.close()
+        self.flush()
         relpath = path[len(os.path.dirname(self.path)):].strip(os.sep)
         parts = relpath.split(os.sep)
         relpath = os.path.dirname(relpath.split(os.sep, 1)[-1])
@@ -190,34 +215,52 @@ class DocExtract (object) :
             parts[-1] = os.path.splitext(parts[-1])[0]
             self.module = ".".join(parts)
             target =  parts[-1] + ".md"
-        if any(fnmatch.fnmatch(self.module, glob) for glob in self.exclude) :
+        if self._exclude is not None and self._exclude.match(self.module) :
             warn("skip %s" % self.module)
             return False
-        outdir = os.path.join(self.outpath, relpath)
-        outpath = os.path.join(outdir, target)
-        if os.path.exists(outpath) :
+        outpath = os.path.join(self.outpath, relpath, target)
+        try :
             if os.stat(path).st_mtime <= os.stat(outpath).st_mtime :
                 return False
+        except OSError :
+            pass
         self.inpath = path
         info("%s -> %r" % (self.module, outpath))
-        if not os.path.exists(outdir) :
-            os.makedirs(outdir)
-        self.out = codecs.open(outpath, "w", encoding=self.outputenc)
+        self.outfile = outpath
+        self.out = []
         self.classname = None
         return True
+    def flush (self) :
+        """Write the content of `self.out` to the current output file
+        at once, and release the buffer
+        """
+        if self.out is None :
+            return
+        outdir = os.path.dirname(self.outfile)
+        if not os.path.isdir(outdir) :
+            try :
+                os.makedirs(outdir)
+            except OSError :
+                # another worker may have just created it
+                if not os.path.isdir(outdir) :
+                    raise
+        with codecs.open(self.outfile, "w", encoding=self.outputenc) as out :
+            out.write("".join(self.out))
+        self.out = None
     def write (self, text) :
         """Write `text` to output file
 
         @param text: the text to write
         @type text: `str`
         """
-        if len(text) > 1 :
-            self._last = text[-2:]
-        elif len(text) > 0 :
-            self._last = self._last[-1] + text[-1]
-        else :
+        if not text :
             return
-        self.out.write(text)
+        stripped = text.rstrip("\n")
+        if stripped :
+            self._newlines = len(text) - len(stripped)
+        else :
+            self._newlines += len(text)
+        self.out.append(text)
     def newline (self) :
         """Write a blank line to output file, never more than one
         blank line is written so there is no need to be carefull about
@@ -225,7 +268,7 @@ class DocExtract (object) :
         complicated when multiple calls are made from different
         locations).
         """
-        if self._last != "\n\n" :
+        if self._newlines < 2 :
             self.write("\n")
     def writeline (self, text="") :
         """Write a line of text to output file, ensuring there is a
@@ -236,16 +279,29 @@ class DocExtract (object) :
         @type text: `str`
         """
         self.write(text.rstrip() + "\n")
+    def wrapper (self, **args) :
+        """Return a `textwrap.TextWrapper` built from `args`, the
+        instances are cached so that each distinct combination of
+        arguments is built only once by this instance
+
+        @param args: arguments to `textwrap.TextWrapper`, with
+            `break_on_hyphens` defaulting to `False`
+        @rtype: `textwrap.TextWrapper`
+        """
+        args.setdefault("break_on_hyphens", False)
+        key = tuple(sorted(args.items()))
+        if key not in self._wrappers :
+            self._wrappers[key] = textwrap.TextWrapper(**args)
+        return self._wrappers[key]
     def writetext (self, text, **args) :
         """Write some `text` to output file, with line wrapping.
 
         @param text: the text to write
         @type text: `str`
-        @param args: additional arguments to `textwrap.wrap`
+        @param args: additional arguments to `textwrap.TextWrapper`
         """
-        br = args.pop("break_on_hyphens", False)
-        for line in textwrap.wrap(text, break_on_hyphens=br, **args) :
-            self.writeline(line)
+        self.write("".join(line.rstrip() + "\n"
+                           for line in self.wrapper(**args).wrap(text)))
     def writelist (self, text, bullet="  * ", **args) :
         """Write one list item to output file, wrapping the text
         properly.
@@ -254,39 +310,102 @@ class DocExtract (object) :
         @type text: `str`
         @param bullet: list marker
         @type bullet: `str`
-        @param args: additional arguments to `textwrap.wrap`
-        """
-        br = args.pop("break_on_hyphens", False)
-        for line in textwrap.wrap(text, break_on_hyphens=br,
-                                  initial_indent=bullet,
-                                  subsequent_indent=" "*len(bullet),
-                                  **args) :
-            self.writeline(line)
-    def process (self) :
+        @param args: additional arguments to `textwrap.TextWrapper`
+        """
+        wrapper = self.wrapper(initial_indent=bullet,
+                               subsequent_indent=" "*len(bullet),
+                               **args)
+        self.write("".join(line.rstrip() + "\n"
+                           for line in wrapper.wrap(text)))
+    def process (self, jobs=1) :
         """Main method that process input directory and write
         converted files to output directory.
 
-        Each input file is parsed using `snakes.lang.python` to an AST
-        that is then traversed for processing.
+        Files are independent from each other so they may be
+        processed in parallel using `jobs` worker processes, each
+        running `extract` on its own copy of `self`. By default, they
+        are processed sequentially.
+
+        @param jobs: number of worker processes, or `None` to use as
+            many as there are CPUs
+        @type jobs: `int`
         """
-        for dirpath, dirnames, filenames in os.walk(self.path) :
-            for name in sorted(filenames) :
-                if not name.endswith(".py") or name.startswith(".") :
-                    continue
-                path = os.path.join(dirpath, name)
-                if not self.openout(path) :
-                    continue
-                try :
-                    node = parse(codecs.open(path, encoding=self.inputenc).read())
-                except Exception as e :
-                    err("error parsing %r (%s)" % (path, e))
-                    continue
+        paths = list(_pyfiles(self.path))
+        if jobs is None :
+            jobs = multiprocessing.cpu_count()
+        if jobs < 2 or len(paths) < 4 :
+            for path in paths :
+                self.extract(path)
+            return
+        pool = multiprocessing.Pool(jobs, _initworker, (self,))
+        try :
+            pool.map(_extract, paths)
+        finally :
+            pool.close()
+            pool.join()
+    def extract (self, path) :
+        """Convert one input file to its output file.
+
+        The file is parsed using Python's `ast` module to an AST that
+        is then traversed for processing, its source lines are kept
+        in `self.lines` to extract definitions and directives.
+
+        @param path: input file to be converted
+        @type path: `str`
+        """
+        if not self.openout(path) :
+            return
+        try :
+            with open(path, "rb") as infile :
+                src = infile.read().decode(self.inputenc)
+            node = compile(src, path, "exec", ast.PyCF_ONLY_AST)
+        except Exception as e :
+            err("error parsing %r (%s)" % (path, e))
+        else :
+            self.lines = src.splitlines(True)
+            self.directives = self.finddirectives(src)
+            try :
                 if ".plugins." in self.module :
                     self.visit_plugin(node)
                 else :
                     self.visit_module(node)
+            except Exception :
+                self.failed(path, sys.exc_info()[2])
+                raise
+        self.flush()
+    def failed (self, path, trace) :
+        """Report the position of the innermost node that was being
+        visited when an exception was raised
+
+        @param path: input file being converted
+        @type path: `str`
+        @param trace: the traceback of the exception
+        @type trace: `traceback`
+        """
+        lineno = None
+        while trace is not None :
+            node = trace.tb_frame.f_locals.get("node")
+            if getattr(node, "lineno", None) is not None :
+                lineno = node.lineno
+            trace = trace.tb_next
+        if lineno is not None :
+            src = self.lines[lineno-1].strip()
+            if len(src) > 40 :
+                src = src[:40] + "..."
+            err("%s line %s source %r" % (path, lineno, src))
     def _pass (self, node) :
         pass
+    def firstline (self, node) :
+        """Return the first line number of `node`, including its
+        decorators if any, or `None` if the node has no position
+
+        @param node: an AST node
+        @type node: `AST`
+        @rtype: `int`
+        """
+        if getattr(node, "decorator_list", None) :
+            return node.decorator_list[0].lineno
+        return getattr(node, "lineno", None)
     def directive (self, node) :
         """Return directives (skip, stop, include) for this node, or
         `None`
@@ -294,13 +413,9 @@ class DocExtract (object) :
         @param node: an AST node
         @type node: `AST`
         """
-        lines = node.st.text.lexer.lines
-        num = node.st.srow - 2
-        while num >= 0 and (not lines[num].strip()
-                            or lines[num].strip().startswith("@")) :
-            num -= 1
-        if num >= 0 and lines[num].strip().startswith("#") :
-            dirline = lines[num].lstrip("# \t").rstrip()
+        found = self.directives.get(self.firstline(node))
+        if found is not None :
+            num, dirline = found
             items = shlex.split(dirline)
             if len(items) >= 2 and items[0].lower() == "apidoc" :
                 if len(items) == 2 and items[1].lower() in ("skip", "stop") :
@@ -317,16 +432,72 @@ class DocExtract (object) :
                     err("unknown directive %r (line %s)"
                         % (items[1], num+1))
                     return None
+    _dircomment = re.compile(r"^[ \t]*#.*apidoc", re.M | re.I)
+    def finddirectives (self, src) :
+        """Scan `self.lines` once to locate the comments that may hold
+        directives, this is skipped if a search in the raw source
+        finds no such comment
+
+        @param src: the source code split into `self.lines`
+        @type src: `str`
+        @return: a dict that maps the number of each line to the line
+            index and text of the comment that precedes it (skipping
+            empty lines and decorators), for the comments that mention
+            `apidoc`
+        @rtype: `dict`
+
+        Before Python 3.8, a multi-line string statement has the
+        number of its last line, so the comment is also mapped to
+        this line.
+
+        >>> d = DocExtract(".", ".")
+        >>> src = "# apidoc include 'hello.py'\\n'''multi-line\\nstring'''\\n"
+        >>> d.lines = src.splitlines(True)
+        >>> d.directives = d.finddirectives(src)
+        >>> for num, found in sorted(d.directives.items()) :
+        ...     print("%s %s" % (num, found))
+        2 (0, "apidoc include 'hello.py'")
+        3 (0, "apidoc include 'hello.py'")
+        >>> node = ast.parse(src).body[0]
+        >>> d.directives[d.firstline(node)]
+        (0, "apidoc include 'hello.py'")
+        """
+        found = {}
+        if self._dircomment.search(src) is None :
+            return found
+        last = None
+        for num, line in enumerate(self.lines) :
+            if last is not None :
+                found[num+1] = last
+            line = line.strip()
+            if not line or line.startswith("@") :
+                continue
+            elif line.startswith("#") and "apidoc" in line.lower() :
+                last = (num, line.lstrip("# \t"))
+            else :
+                last = None
+        if found :
+            lines = iter(self.lines)
+            for tok in tokenize.generate_tokens(lambda: next(lines, "")) :
+                if (tok[0] == tokenize.STRING and tok[2][0] in found
+                    and tok[3][0] > tok[2][0]) :
+                    found[tok[3][0]] = found[tok[2][0]]
+        return found
     def children (self, node) :
         """Iterates over the children of `node`
 
-        @param node: an AST node
+        @param node: an AST node, or directly a list of nodes to
+            iterate over (for instance the body of a function)
         @type node: `AST`
         @return: all the children but the `skip`ped ones, until the
             end of `stop` directive is found
         @rtype: `generator`
         """
-        for child in ast.iter_child_nodes(node) :
+        if isinstance(node, list) :
+            nodes = node
+        else :
+            nodes = ast.iter_child_nodes(node)
+        for child in nodes :
             directive = self.directive(child)
             if directive == "skip" :
                 continue
@@ -335,21 +506,21 @@ class DocExtract (object) :
             yield child
     def visit (self, node) :
         """Generic visit of a node that actually dispatch to the
-        appropriate method `visit_...`
+        appropriate method `visit_...`, the methods are cached by node
+        class in `self._visitors`
         """
         name = getattr(node, "name", "__")
         if (name.startswith("_") and not (name.startswith("__")
                                           and name.endswith("__"))) :
             return
+        cls = node.__class__
         try :
-            getattr(self, "visit_" + node.__class__.__name__,
-                    self._pass)(node)
-        except :
-            src = node.st.source()
-            if len(src) > 40 :
-                src = src[:40] + "..."
-            err("line %s source %r" % (node.lineno, src))
-            raise
+            method = self._visitors[cls]
+        except KeyError :
+            method = self._visitors[cls] = getattr(self,
+                                                   "visit_" + cls.__name__,
+                                                   self._pass)
+        method(node)
     def visit_module (self, node) :
         """Visit a node that is a module
         """
@@ -362,13 +533,13 @@ class DocExtract (object) :
         self.write_module()
         extend = None
         for child in self.children(node) :
-            if (getattr(child, "name", None) == "extend"
-                and isinstance(child, ast.FunctionDef)) :
+            if (isinstance(child, ast.FunctionDef)
+                and child.name == "extend") :
                 extend = child
             else :
                 self.visit(child)
         self.write_plugin()
-        for child in self.children(extend) :
+        for child in self.children(extend.body) :
             self.visit(child)
     def visit_ClassDef (self, node) :
         """Visit a node that is a class definition
@@ -382,14 +553,18 @@ class DocExtract (object) :
         """Visit a node that is a function definition
         """
         self.write_function(node)
-        self.args = [n.arg for n in node.args.args]
+        self.args = [_argname(n) for n in node.args.args]
         if self.args and self.args[0] == "self" :
             del self.args[0]
         if node.args.vararg :
-            self.args.append(node.args.vararg)
+            self.args.append(_argname(node.args.vararg))
         if node.args.kwarg :
-            self.args.append(node.args.kwarg)
-        self.visit(node.body[0])
+            self.args.append(_argname(node.args.kwarg))
+        doc = ast.get_docstring(node, False)
+        if doc is None :
+            self.visit(node.body[0])
+        else :
+            self.write_doc(self.cleandoc(doc))
         self.args = []
     def visit_Expr (self, node) :
         """Visit a node that is an expression
@@ -398,7 +573,13 @@ class DocExtract (object) :
     def visit_Str (self, node) :
         """Visit a node that is a string literal
         """
-        self.write_doc(inspect.cleandoc(node.s))
+        self.write_doc(self.cleandoc(node.s))
+    def visit_Constant (self, node) :
+        """Visit a node that is a constant, only string literals are
+        considered
+        """
+        if isinstance(node.value, str) :
+            self.write_doc(self.cleandoc(node.value))
     def write_module (self) :
         """Write the documentation about a module (not its content),
         which is just a title. The module name is in `self.module` and
@@ -439,14 +620,10 @@ class DocExtract (object) :
         """Write the documentation about a function or method
         definition (parameters, decorators, etc.)
         """
-        indent = node.st.scol
-        if node.st[0].symbol == "decorated" :
-            srow, scol = node.st[0][0][0][0].srow, node.st[0][0][0][0].scol
-            erow, ecol = node.st[0][1][-2].erow, node.st[0][1][-2].ecol
-        else :
-            srow, scol = node.st[0].srow, node.st[0].scol
-            erow, ecol = node.st[0][-2].erow, node.st[0][-2].ecol
-        lines = node.st.text.lexer.lines
+        indent = scol = node.col_offset
+        srow = self.firstline(node)
+        erow, ecol = self.header(node)
+        lines = self.lines
         if srow == erow :
             source = [lines[srow-1][scol:ecol+1]]
         else :
@@ -456,10 +633,41 @@ class DocExtract (object) :
             source[-1] = source[-1][indent:ecol+1].rstrip() + " ..."
         self.newline()
         self.writeline("    :::python")
-        for line in source :
-            self.writeline("    " + line)
+        self.write("".join(("    " + line).rstrip() + "\n"
+                           for line in source))
         self.newline()
-    parse = doctest.DocTestParser().parse
+    def header (self, node) :
+        """Return the position `(row, col)` of the colon that ends
+        the header of a function or class definition
+
+        @param node: a `FunctionDef` or `ClassDef` node
+        @type node: `AST`
+        @rtype: `tuple`
+        """
+        lines = iter(self.lines[node.lineno-1:])
+        depth = 0
+        for tok in tokenize.generate_tokens(lambda: next(lines, "")) :
+            if tok[0] != tokenize.OP :
+                continue
+            elif tok[1] in ("(", "[", "{") :
+                depth += 1
+            elif tok[1] in (")", "]", "}") :
+                depth -= 1
+            elif tok[1] == ":" and depth == 0 :
+                return node.lineno + tok[2][0] - 1, tok[2][1]
+    def cleandoc (self, doc) :
+        """Version of `inspect.cleandoc` memoized by this instance
+        """
+        if doc not in self._cleaned :
+            self._cleaned[doc] = inspect.cleandoc(doc)
+        return self._cleaned[doc]
+    def parse (self, doc, _parse=doctest.DocTestParser().parse) :
+        """Version of `doctest.DocTestParser.parse` memoized by this
+        instance, the parts are returned as a `tuple`
+        """
+        if doc not in self._parsed :
+            self._parsed[doc] = tuple(_parse(doc))
+        return self._parsed[doc]
     def write_doc (self, doc) :
         """Write the content of a docstring that is parsed to extract
         doctests, Epydoc fields and plain text
@@ -499,34 +707,30 @@ class DocExtract (object) :
                             self.writeline("    >>> %s" % line)
                     for line in doc.want.splitlines() :
                         self.writeline("    %s" % line)
+    _dictfields = frozenset(["param", "type", "keyword", "raise"])
+    _listfields = frozenset(["todo", "note", "attention", "bug", "warning"])
+    _epyfield = re.compile(r"@(\w+)(?:\s+([^:\s]+))?\s*:(.*?)(?=\n@|\Z)",
+                           re.S)
     def write_epydoc (self, doc) :
         """Write a block of epydoc fields
         """
-        info = {"param" : {},
-                "type" : {},
-                "keyword" : {},
-                "raise" : {},
-                "todo" : [],
-                "note" : [],
-                "attention": [],
-                "bug" : [],
-                "warning" : [],
-                }
-        for item in doc.lstrip("@").split("\n@") :
-            left, text = item.split(":", 1)
-            left = left.split()
-            assert 1 <= len(left) <= 2, "unsupported item %r" % item
-            if len(left) == 1 :
-                left.append(None)
-            tag, name = [x.strip() if x else x for x in left]
-            text = " ".join(text.strip().split())
-            if isinstance(info.get(tag, None), list) :
+        # containers for list and dict fields are created on demand
+        info = {}
+        fields = self._epyfield.findall(doc)
+        assert len(fields) == doc.count("\n@") + 1, \
+            "unsupported item in %r" % doc
+        for tag, name, text in fields :
+            item = "%s %s" % (tag, name) if name else tag
+            name = name or None
+            text = " ".join(text.split())
+            if tag in self._listfields :
                 assert name is None, "unsupported item %r" % item
-                info[tag].append(text)
-            elif isinstance(info.get(tag, None), dict) :
+                info.setdefault(tag, []).append(text)
+            elif tag in self._dictfields :
                 assert name is not None, "unsupported item %r" % item
-                assert name not in info[tag], "duplicated item %r" % item
-                info[tag][name] = text
+                assert name not in info.get(tag, ()), \
+                    "duplicated item %r" % item
+                info.setdefault(tag, {})[name] = text
             else :
                 assert name is None, "unsupported item %r" % item
                 assert tag not in info, "duplicated tag %r" % item
@@ -545,34 +749,36 @@ class DocExtract (object) :
                                    subsequent_indent="  ")
                     self.writeline('</li>')
             self.writeline('</ul>')
-        if any(info[k] for k in
+        if any(k in info for k in
                ("todo", "note", "attention", "bug", "warning")) :
             self.newline()
             self.writeline('<div id="api-remarks">')
             for tag in ("note", "todo", "attention", "bug", "warning") :
-                for text in info[tag] :
+                for text in info.get(tag, ()) :
                     self.writeline('<div class="api-%s">' % tag)
                     self.writetext('<span class="api-title">%s:</span> %s'
                                    % (tag.capitalize(), self.md(text)),
                                    subsequent_indent="  ")
                     self.writeline('</div>')
             self.writeline('</div>')
-        if (any(info[k] for k in ("param", "type", "keyword"))
-            or any(k in info for k in ("return", "rtype"))) :
+        if any(k in info for k in
+               ("param", "type", "keyword", "return", "rtype")) :
             self.newline()
             self.writeline("##### Call API #####")
             self.newline()
+            params = info.get("param", {})
+            types = info.get("type", {})
             for arg in self.args :
-                if arg in info["param"] :
+                if arg in params :
                     self.writelist("`%s %s`: %s"
-                                   % (info["type"].get(arg, "object").strip("`"),
+                                   % (types.get(arg, "object").strip("`"),
                                       arg,
-                                      info["param"][arg]))
+                                      params[arg]))
                 else :
                     self.writelist("`%s %s`"
-                                   % (info["type"].get(arg, "object").strip("`"),
+                                   % (types.get(arg, "object").strip("`"),
                                       arg))
-            for kw, text in sorted(info["keyword"].items()) :
+            for kw, text in sorted(info.get("keyword", {}).items()) :
                 self.writelist("keyword `%s`: %s" % (kw, text))
             if any(k in info for k in ("return", "rtype")) :
                 if "return" in info :
@@ -582,7 +788,7 @@ class DocExtract (object) :
                 else :
                     self.writelist("`return %s`"
                                    % (info.get("rtype", "object").strip("`")))
-        if info["raise"] :
+        if "raise" in info :
             self.newline()
             self.writeline("##### Exceptions #####")
             self.newline()
@@ -603,11 +809,50 @@ class DocExtract (object) :
         with codecs.open(path, encoding=self.inputenc) as infile :
             self.newline()
             self.writeline("    :::%s" % lang)
-            for i, line in enumerate(infile) :
-                if first <= i+1 and (last == -1 or i+1 <= last) :
-                    self.writeline("    " + line.rstrip())
+            self.write("".join(("    " + line).rstrip() + "\n"
+                               for i, line in enumerate(infile)
+                               if first <= i+1
+                               and (last == -1 or i+1 <= last)))
             self.newline()
 
+# apidoc skip
+def _argname (node) :
+    # Python 3 has arg nodes, Python 2 has Name nodes for arguments
+    # and plain strings for vararg and kwarg
+    if isinstance(node, str) :
+        return node
+    return getattr(node, "arg", None) or getattr(node, "id", None)
+
+# apidoc skip
+def _pyfiles (root) :
+    if scandir is None :
+        for dirpath, dirnames, filenames in os.walk(root) :
+            for name in sorted(filenames) :
+                if name.endswith(".py") and not name.startswith(".") :
+                    yield os.path.join(dirpath, name)
+        return
+    subdirs = []
+    for entry in sorted(scandir(root), key=lambda e: e.name) :
+        if entry.is_dir(follow_symlinks=False) :
+            subdirs.append(entry.path)
+        elif (entry.name.endswith(".py") and not entry.name.startswith(".")
+              and entry.is_file()) :
+            yield entry.path
+    for path in subdirs :
+        for child in _pyfiles(path) :
+            yield child
+
+# apidoc skip
+def _initworker (finder) :
+    global _finder
+    _finder = finder
+
+_finder = None
+
+# apidoc skip
+def _extract (path) :
+    _finder.extract(path)
+
 def main (finder, args, source=None) :
     """Main function of `apidoc`. Source directory may be given
     explicitly, otherwise it is computed as follows:
@@ -622,7 +867,8 @@ def main (finder, args, source=None) :
     @param finder: `DocExtract` or a subclass of it to perform the
         processing
     @type finder: `class`
-    @param args: command line arguments
+    @param args: command line arguments, starting with an optional
+        `--jobs=N` to process files using `N` worker processes
     @type args: `list`
     @param source: the source directory for the code to be documented,
         or `None` to extract documentation from SNAKES
@@ -631,6 +877,10 @@ def main (finder, args, source=None) :
     try :
         if source is None :
             source = os.path.dirname(snakes.__file__)
+        jobs = 1
+        if args and args[0].startswith("--jobs=") :
+            jobs = int(args[0].split("=", 1)[1])
+            args = args[1:]
         target = args[0]
         exclude = args[1:]
         if not os.path.isdir(source) :
@@ -638,12 +888,14 @@ def main (finder, args, source=None) :
         elif not os.path.isdir(target) :
             raise Exception("no directory %r" % target)
     except (ValueError, IndexError) :
-        die("""Usage: python -m snakes.utils.apidoc TARGET [EXCLUDE...]
-        TARGET   target directory to write files
-        EXCLUDE  pattern to exclude modules (not file names)""")
+        die("Usage: python -m snakes.utils.apidoc"
+            " [--jobs=N] TARGET [EXCLUDE...]\n"
+            "        N        number of worker processes (default: 1)\n"
+            "        TARGET   target directory to write files\n"
+            "        EXCLUDE  pattern to exclude modules (not file names)")
     except Exception as error :
         die(str(error))
-    finder(source, target, exclude).process()
+    finder(source, target, exclude).process(jobs)
 
 if __name__ == "__main__" :
     main(DocExtract, sys.argv[1:])
@@ -7,40 +7,67 @@ class SpecError (Exception) :
     def __init__ (self, node, reason) :
         Exception.__init__(self, "[line %s] %s" % (node.lineno, reason))
 
+_fields = {}
+
 def astcopy (node) :
     if not isinstance(node, _ast.AST) :
         return node
-    attr = {}
-    for name in node._fields + node._attributes :
+    cls = node.__class__
+    try :
+        names = _fields[cls]
+    except KeyError :
+        names = _fields[cls] = cls._fields + cls._attributes
+    new = cls.__new__(cls)
+    for name in names :
         value = getattr(node, name)
         if isinstance(value, list) :
-            attr[name] = [astcopy(child) for child in value]
-        else :
-            attr[name] = astcopy(value)
-    return node.__class__(**attr)
+            value = [astcopy(child) if isinstance(child, _ast.AST) else child
+                     for child in value]
+        elif isinstance(value, _ast.AST) :
+            value = astcopy(value)
+        setattr(new, name, value)
+    return new
+
+def astclone (node) :
+    cls = node.__class__
+    try :
+        names = _fields[cls]
+    except KeyError :
+        names = _fields[cls] = cls._fields + cls._attributes
+    new = cls.__new__(cls)
+    for name in names :
+        setattr(new, name, getattr(node, name))
+    return new
 
 class Builder (object) :
     def __init__ (self, spec) :
         self.spec = spec
         self.decl = {}
         for node in spec.atoms + spec.properties :
-            if node.name in self.decl :
-                raise SpecError(node, "%r already declare line %s"
-                                % (name.name, self.decl[name.name].lineno))
+            prev = self.decl.get(node.name)
+            if prev is not None :
+                raise SpecError(node, "%r already declared line %s"
+                                % (node.name, prev.lineno))
             self.decl[node.name] = node
         self.main = spec.main
+        self._builders = {}
     def build (self, node) :
-        node = astcopy(node)
         return self._build(node, {})
     def _build (self, node, ctx) :
+        # nodes are cloned before being updated so that the spec is
+        # left unchanged and may be built again
+        if isinstance(node, (ast.atom, ast.CtlBinary, ast.CtlUnary)) :
+            node = astclone(node)
         if isinstance(node, ast.atom) :
+            cls = node.__class__
             try :
-                builder = getattr(self, "_build_%s" % node.__class__.__name__)
-            except AttributeError :
-                node.atomic = True
-            else :
+                builder = self._builders[cls]
+            except KeyError :
+                builder = self._builders[cls] = getattr(self, "_build_%s"
+                                                        % cls.__name__, None)
+            if builder is not None :
                 node = builder(node, ctx)
-                node.atomic = True
+            node.atomic = True
         elif isinstance(node, ast.CtlBinary) :
             node.left = self._build(node.left, ctx)
             node.right = self._build(node.right, ctx)
@@ -64,7 +91,8 @@ class Builder (object) :
         else :
             return param
     def _build_InPlace (self, node, ctx) :
-        node.data = [bind(child, ctx) for child in node.data]
+        # data is copied because bind() updates the tree in place
+        node.data = [bind(astcopy(child), ctx) for child in node.data]
         node.place = self._build_place(node.place, ctx)
         return node
     def _build_NotInPlace (self, node, ctx) :
@@ -109,16 +137,18 @@ class Builder (object) :
                 if not isinstance(arg, ast.Place) :
                     raise SpecError(node, "expected place for %r"
                                     % param.name)
+                arg = astclone(arg)
                 arg.name = param.name
             ctx[param.name] = arg
         if args :
             raise SpecError(node, "too many arguments (%s)"
                             % ", ".join(repr(a) for a in args))
-        return self._build(astcopy(prop.body), ctx)
+        return self._build(prop.body, ctx)
     def _build_Instance_Atom (self, node, atom, ctx) :
         bound = set(a.name for a in atom.args)
         args = dict((a.arg, a.annotation) for a in node.args)
-        new = astcopy(atom)
+        new = astclone(atom)
+        new.args = list(atom.args)
         for param in atom.params :
             if param.name in bound :
                 raise SpecError(node, "argument %r already bound"
@@ -132,6 +162,7 @@ class Builder (object) :
                 if not isinstance(arg, ast.Place) :
                     raise SpecError(node, "expected place for %r"
                                     % param.name)
+                arg = astclone(arg)
                 arg.name = param.name
             else :
                 arg = ast.Argument(name=param.name,
@@ -141,10 +172,51 @@ class Builder (object) :
         if args :
             raise SpecError(node, "too many arguments (%s)"
                             % ", ".join(repr(a) for a in args))
-        del new.params[:]
+        new.params = []
         return new
 
 def build (spec) :
+    """Build the main formula of a CTL* specification, instantiating
+    the properties and atoms it uses. The specification itself is not
+    modified and may thus be built again.
+
+    The specification below is the AST of `prop hasv (q : place, v :
+    int) : has(q, v + 1)` followed by the formula `hasv(q=@'p1', v=1)
+    and hasv(q=@'p2', v=2)`.
+
+    >>> body = ast.InPlace(data=[ast.BinOp(left=ast.Name(id='v',
+    ...                                                  ctx=ast.Load()),
+    ...                                    op=ast.Add(),
+    ...                                    right=ast.Num(n=1))],
+    ...                    place=ast.Parameter(name='q', type='place'))
+    >>> hasv = ast.Property(name='hasv', args=[], body=body,
+    ...                     params=[ast.Parameter(name='q', type='place'),
+    ...                             ast.Parameter(name='v', type='int')])
+    >>> def inst (place, value) :
+    ...     return ast.Instance(name='hasv', args=[
+    ...         ast.arg(arg='q', annotation=ast.Place(name=None,
+    ...                                               place=place)),
+    ...         ast.arg(arg='v', annotation=ast.Num(n=value))])
+    >>> spec = ast.Spec(atoms=[], properties=[hasv],
+    ...                 main=ast.CtlBinary(op=ast.And(),
+    ...                                    left=inst('p1', 1),
+    ...                                    right=inst('p2', 2)))
+    >>> tree = build(spec)
+    >>> tree.left.data, tree.left.place.place
+    (['(1 + 1)'], 'p1')
+    >>> tree.right.data, tree.right.place.place
+    (['(2 + 1)'], 'p2')
+    >>> build(spec).right.data
+    ['(2 + 1)']
+    >>> body.data[0].left.id
+    'v'
+
+    @param spec: the specification, either as a string or already
+        parsed
+    @type spec: `str` or `ast.Spec`
+    @return: the built main formula
+    @rtype: `ast.form`
+    """
     if isinstance(spec, str) :
         spec = parse(spec)
     return Builder(spec).build(spec.main)
@@ -2,54 +2,89 @@ import snakes
 from snakes.utils.simul.httpd import *
 from snakes.utils.simul.html import H
 from snakes.utils.simul import logger as log
-import multiprocessing, time, sys, os.path, signal, inspect, glob
+import multiprocessing, threading, time, sys, os.path, inspect, glob
 import operator
 
-class StateSpace (dict) :
+class StateSpace (object) :
     def __init__ (self, net) :
         self.net = net
+        self._by_id = []
+        self._by_marking = {}
+        self._succ = {}
+        self.lock = threading.RLock()
         self.current = self.add(net.get_marking())
+        self._loaded = self._by_id[self.current]
+    def __len__ (self) :
+        return len(self._by_id)
+    def __getitem__ (self, state) :
+        return self._by_id[state]
     def get (self) :
-        return self[self.current]
+        return self._by_id[self.current]
     def add (self, marking) :
-        if marking in self :
-            return self[marking].num
-        else :
-            marking.num = len(self) / 2
-            self[marking] = self[marking.num] = marking
-            self.setmodes(marking.num)
-            return marking.num
+        num = self._by_marking.get(marking)
+        if num is None :
+            num = marking.num = len(self._by_id)
+            marking.modes = None
+            self._by_marking[marking] = num
+            self._by_id.append(marking)
+        return num
+    def load (self, marking) :
+        if marking is not self._loaded :
+            self.net.set_marking(marking)
+            self._loaded = marking
     def setmodes (self, state) :
-        marking = self[state]
-        self.net.set_marking(marking)
+        marking = self._by_id[state]
+        self.load(marking)
         marking.modes = []
         for trans in self.net.transition() :
             for mode in trans.modes() :
                 marking.modes.append((trans, mode))
     def succ (self, state, mode) :
-        marking = self[state]
-        trans, binding = marking.modes[mode]
-        self.net.set_marking(marking)
-        trans.fire(binding)
-        self.current = self.add(self.net.get_marking())
-        return self.current
+        with self.lock :
+            num = self._succ.get((state, mode))
+            if num is None :
+                marking = self._by_id[state]
+                trans, binding = self.modes(state)[mode]
+                self.load(marking)
+                self._loaded = None
+                trans.fire(binding)
+                num = self.add(self.net.get_marking())
+                self._loaded = self._by_id[num]
+                self._succ[state, mode] = num
+            self.current = num
+            return num
     def modes (self, state) :
-        return self[state].modes
+        with self.lock :
+            marking = self._by_id[state]
+            if marking.modes is None :
+                self.setmodes(state)
+            return marking.modes
 
 shutdown = multiprocessing.Event()
-ping = multiprocessing.Event()
+pinged, ping = multiprocessing.Pipe(False)
+_pinglock = threading.Lock()
+
+def flushpings () :
+    while pinged.poll() :
+        pinged.recv_bytes()
 
 class Server (multiprocessing.Process) :
     def __init__ (self, httpd) :
         multiprocessing.Process.__init__(self)
         self.httpd = httpd
     def run (self) :
+        stopper = threading.Thread(target=self.stop)
+        stopper.daemon = True
+        stopper.start()
         try :
             self.httpd.serve_forever()
         except KeyboardInterrupt :
             pass
         finally :
             shutdown.set()
+    def stop (self) :
+        shutdown.wait()
+        self.httpd.shutdown()
 
 class WatchDog (multiprocessing.Process) :
     def __init__ (self, timeout=30) :
@@ -58,8 +93,8 @@ class WatchDog (multiprocessing.Process) :
     def run (self) :
         try :
             while True :
-                if ping.wait(self.timeout) :
-                    ping.clear()
+                if pinged.poll(self.timeout) :
+                    flushpings()
                 else :
                     log.info("client has gone", "simul")
                     break
@@ -71,6 +106,7 @@ class WatchDog (multiprocessing.Process) :
 class BaseSimulator (object) :
     def __init__ (self, net) :
         self.states = StateSpace(net)
+        self.nethtml = str(H.i(net))
     def getstate (self, state) :
         marking = self.states[state]
         places = ["%s = %s" % (H.span(place.name, class_="place"),
@@ -81,11 +117,12 @@ class BaseSimulator (object) :
                   "mode" : i,
                   "html" : "%s : %s" % (H.span(trans.name, class_="trans"),
                                         H.span(binding, class_="binding"))}
-                  for i, (trans, binding) in enumerate(marking.modes)]
+                  for i, (trans, binding)
+                  in enumerate(self.states.modes(state))]
         return {"id" : state,
                 "states" : [{"do" : "sethtml",
                              "select" : "#net",
-                             "html" : H.i(self.states.net)},
+                             "html" : self.nethtml},
                             {"do" : "settext",
                              "select" : "#state",
                              "text" : state},
@@ -128,23 +165,41 @@ class BaseSimulator (object) :
             },
         }
 
-class BaseHTTPSimulator (Node) :
-    def __init__ (self, net=None, port=8000, respatt=[], simulator=None) :
-        self.res = {}
+_paths = {}
+
+def srcpaths (cls) :
+    if cls not in _paths :
+        _paths[cls] = [os.path.dirname(inspect.getsourcefile(c))
+                       for c in reversed(inspect.getmro(cls)[:-2])]
+    return _paths[cls]
+
+_resources = {}
+
+def loadres (cls, respatt=[]) :
+    key = (cls, tuple(respatt))
+    if key not in _resources :
+        found = {}
         dirs = {}
-        for cls in reversed(inspect.getmro(self.__class__)[:-2]) :
-            path = os.path.dirname(inspect.getsourcefile(cls))
-            for pattern in respatt + ["resources/*/*.*",
-                                      "resources/*.*"] :
+        for path in srcpaths(cls) :
+            for pattern in list(respatt) + ["resources/*/*.*",
+                                            "resources/*.*"] :
                 for res in glob.glob(os.path.join(path, pattern)) :
                     if os.path.isfile(res) :
                         with open(res) as infile :
-                            self.res[res[len(path + "resources/")+1:]] = infile.read()
+                            found[res[len(path + "resources/")+1:]] = infile.read()
                     elif os.path.isdir(res) :
                         dirs[os.path.basename(res)] = DirNode(res)
                     else :
                         raise ValueError("invalid resource %r" % res)
-        Node.__init__(self, r=ResourceNode(self.res, dirs))
+        _resources[key] = found, dirs
+    return _resources[key]
+
+class BaseHTTPSimulator (Node) :
+    grace = 2
+    def __init__ (self, net=None, port=8000, respatt=[], simulator=None) :
+        res, dirs = loadres(self.__class__, respatt)
+        self.res = dict(res)
+        Node.__init__(self, r=ResourceNode(self.res, dict(dirs)))
         # create HTTP server
         self.port = port
         while True :
@@ -160,6 +215,7 @@ class BaseHTTPSimulator (Node) :
         self.url = "http://127.0.0.1:%s/%s/" % (port, httpd.key)
         self._alive = self.res["alive.txt"].splitlines()
         self._ping = 0
+        self._lastping = 0.0
         if simulator is None :
             self.simul = BaseSimulator(net)
         else :
@@ -167,24 +223,21 @@ class BaseHTTPSimulator (Node) :
     def start (self) :
         log.info("starting at %r" % self.url, "simul")
         shutdown.clear()
-        ping.clear()
+        flushpings()
         self.server.start()
         self.watchdog.start()
     def wait (self) :
         try :
             shutdown.wait()
             log.info("preparing to shut down...", "simul")
-            time.sleep(2)
+            self.server.join(self.grace)
         except KeyboardInterrupt :
             shutdown.set()
         log.info("shuting down...", "simul")
-        sig = getattr(signal, "CTRL_C_EVENT",
-                      getattr(signal, "SIGTERM", None))
-        if sig is not None :
-            if self.server.pid :
-                os.kill(self.server.pid, sig)
-            if self.watchdog.pid :
-                os.kill(self.watchdog.pid, sig)
+        for proc in (self.server, self.watchdog) :
+            if proc.is_alive() :
+                proc.terminate()
+            proc.join()
         log.info("bye!", "simul")
     def init_index (self) :
         return {"res" : "%sr" % self.url,
@@ -225,9 +278,14 @@ class BaseHTTPSimulator (Node) :
         return self.simul.succ(state, mode)
     @http("text/plain")
     def ping (self) :
-        ping.set()
-        alive = self._alive[self._ping % len(self._alive)]
-        self._ping += 1
+        # requests are handled in concurrent threads that share the pipe
+        with _pinglock :
+            now = time.time()
+            if now - self._lastping >= self.watchdog.timeout / 4.0 :
+                self._lastping = now
+                ping.send_bytes(b".")
+            alive = self._alive[self._ping % len(self._alive)]
+            self._ping += 1
         return alive
     @http("text/plain")
     def quit (self) :
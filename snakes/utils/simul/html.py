@@ -3,6 +3,10 @@ import json as JSON
 def _tag (name) :
     return name.lower().strip("_")
 
+def _quote (value) :
+    return (str(value).replace("&", "&amp;")
+            .replace('"', "&quot;").replace("<", "&lt;"))
+
 class Tag (object) :
     default = {"a" : {"href" : "#"}}
     noclose = set([None, "br"])
@@ -36,26 +40,31 @@ class Tag (object) :
         self.attr.pop(_tag(key), None)
     def __contains__ (self, key) :
         return _tag(key) in self.attr
-    def __str__ (self) :
+    def _open (self) :
         attr = self.attr.copy()
-        for key, value in self.default.get(self.name, {}).items() :
-            if key not in attr :
-                attr[key] = value
+        for k, v in self.default.get(self.name, {}).items() :
+            if k not in attr :
+                attr[k] = v
         if self.name is None :
-            return "".join(str(c) for c in self.children)
-        elif attr :
-            ret = "<%s %s>%s" % (
-                self.name,
-                " ".join("%s=%r" % a for a in attr.items()),
-                "".join(str(c) for c in self.children))
-        else :
-            ret = "<%s>%s" % (
-                self.name,
-                "".join(str(c) for c in self.children))
+            return "", ""
+        head = "".join(" %s=\"%s\"" % (k, _quote(v)) for k, v in attr.items())
         if self.children or self.name not in self.noclose :
-            return ret + "</%s>" % self.name
+            return "<%s%s>" % (self.name, head), "</%s>" % self.name
         else :
-            return ret[:-1] + "/>"
+            return "<%s%s/>" % (self.name, head), ""
+    def __str__ (self) :
+        out = []
+        todo = [self]
+        while todo :
+            item = todo.pop()
+            if isinstance(item, Tag) :
+                head, tail = item._open()
+                out.append(head)
+                todo.append(tail)
+                todo.extend(reversed(item.children))
+            else :
+                out.append(str(item))
+        return "".join(out)
     def __repr__ (self) :
         return repr(str(self))
 
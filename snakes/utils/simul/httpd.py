@@ -1,8 +1,13 @@
 import sys, os.path, cgi, functools, mimetypes
-import os, traceback, random, base64, inspect
+import os, traceback, base64, gzip, io, hashlib, shutil, inspect
 from snakes.utils.simul import logger as log
 from snakes.utils.simul.html import json, utf8
 
+try :
+    from inspect import getfullargspec as getargspec
+except ImportError :
+    from inspect import getargspec
+
 try :
     import httplib
 except :
@@ -13,6 +18,11 @@ try :
 except :
     import urllib as urlparse
 
+try :
+    import SocketServer as socketserver
+except :
+    import socketserver
+
 try :
     import BaseHTTPServer
 except :
@@ -48,12 +58,40 @@ encoders = {"application/json" : json,
             "text/html" : utf8,
             }
 
+def binder (method) :
+    spec = getargspec(method)
+    if spec[1] or spec[2] or spec[4:5] and spec[4] :
+        # *args, **kw or keyword-only arguments
+        return lambda larg, karg : inspect.getcallargs(method, *larg, **karg)
+    names = spec[0]
+    if spec[3] :
+        defaults = dict(zip(names[-len(spec[3]):], spec[3]))
+    else :
+        defaults = {}
+    def bind (larg, karg) :
+        if len(larg) > len(names) :
+            raise TypeError("too many arguments")
+        args = dict(defaults)
+        args.update(zip(names, larg))
+        for key, value in karg.items() :
+            if key in names[:len(larg)] :
+                raise TypeError("multiple values for %r" % key)
+            elif key not in names :
+                raise TypeError("unexpected argument %r" % key)
+            args[key] = value
+        for name in names :
+            if name not in args :
+                raise TypeError("missing argument %r" % name)
+        return args
+    return bind
+
 def http (content_type=None, **types) :
     def decorator (method) :
+        bind = binder(method)
         @functools.wraps(method)
         def wrapper (*larg, **karg) :
             try :
-                args = inspect.getcallargs(method, *larg, **karg)
+                args = bind(larg, karg)
                 for a, t in types.items() :
                     if a in args :
                         args[a] = t(args[a])
@@ -73,6 +111,19 @@ def http (content_type=None, **types) :
         return wrapper
     return decorator
 
+_types = {}
+
+def guesstype (path) :
+    root, ext = os.path.splitext(path)
+    if ext in mimetypes.encodings_map :
+        ext = os.path.splitext(root)[1] + ext
+    try :
+        return _types[ext]
+    except KeyError :
+        ct = _types[ext] = (mimetypes.guess_type(path)[0]
+                            or "application/octet-stream")
+        return ct
+
 class Node (object) :
     def __init__ (self, **children) :
         for child, node in children.items() :
@@ -100,24 +151,39 @@ class DirNode (Node) :
         path = os.path.join(self.root, path.lstrip("./"))
         if not os.path.isfile(path) :
             raise HTTPError(httplib.NOT_FOUND)
-        ct = mimetypes.guess_type(path)[0] or "application/octet-stream"
-        @http(ct)
+        ct = guesstype(path)
+        st = os.stat(path)
+        @http()
         def handler () :
-            return open(path).read()
+            return ct, open(path, "rb")
+        handler.etag = '"%x-%x"' % (st.st_size, int(st.st_mtime * 1000000))
         return handler
 
 class ResourceNode (Node) :
     def __init__ (self, data, dirs) :
         self.data = data
         self.dirs = dirs
-        self.ct = dict((path, mimetypes.guess_type(path)[0]
-                        or "application/octet-stream")
-                       for path in self.data)
+        self.ct = dict((path, guesstype(path)) for path in self.data)
+        self.body = {}
+        self.etag = {}
+        self.gz = {}
+        for path, content in self.data.items() :
+            body = encoders.get(self.ct[path], str)(content)
+            if not isinstance(body, bytes) :
+                body = body.encode("utf-8")
+            self.body[path] = body
+            self.etag[path] = '"%s"' % hashlib.md5(body).hexdigest()
+    def gzipped (self, path) :
+        if path not in self.gz :
+            self.gz[path] = gzipped(self.body[path])
+        return self.gz[path]
     def __getitem__ (self, path) :
         if path in self.data :
-            @http(self.ct[path])
+            @http()
             def handler () :
-                return self.data[path]
+                return self.ct[path], self.body[path]
+            handler.etag = self.etag[path]
+            handler.gzipped = functools.partial(self.gzipped, path)
             return handler
         else :
             try :
@@ -131,7 +197,15 @@ class ResourceNode (Node) :
 ##
 ##
 
+def gzipped (data) :
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=6) as out :
+        out.write(data)
+    return buf.getvalue()
+
 class HTTPRequestHandler (BaseHTTPServer.BaseHTTPRequestHandler) :
+    gzipmin = 1024
+    gziptypes = set(["application/json", "application/javascript"])
     def do_GET (self) :
         url = self.geturl()
         self.do(url, url.query)
@@ -157,9 +231,31 @@ class HTTPRequestHandler (BaseHTTPServer.BaseHTTPRequestHandler) :
                 handler = self.server[url.path]
             except KeyError :
                 raise HTTPError(httplib.NOT_FOUND)
+            etag = getattr(handler, "etag", None)
+            if etag is not None and self.cached(etag) :
+                self.send_response(httplib.NOT_MODIFIED)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
             content_type, data = handler(**query)
             self.send_response(httplib.OK)
             self.send_header("Content-type", content_type)
+            if etag is not None :
+                self.send_header("ETag", etag)
+            if hasattr(data, "read") :
+                with data :
+                    size = os.fstat(data.fileno()).st_size
+                    self.send_header("Content-length", size)
+                    self.end_headers()
+                    self.sendfile(data, size)
+                return
+            if self.compress(content_type, data) :
+                if hasattr(handler, "gzipped") :
+                    data = handler.gzipped()
+                else :
+                    data = gzipped(data)
+                self.send_header("Content-encoding", "gzip")
+                self.send_header("Vary", "Accept-Encoding")
             self.send_header("Content-length", len(data))
             self.end_headers()
             self.wfile.write(data)
@@ -174,6 +270,32 @@ class HTTPRequestHandler (BaseHTTPServer.BaseHTTPRequestHandler) :
                              "<body><p>%s</p></body>" % (v.answer, v.message))
             if v.code == 500 :
                 traceback.print_exception(*v.debug)
+    def sendfile (self, infile, size) :
+        try :
+            self.wfile.flush()
+            sendfile, out = os.sendfile, self.wfile.fileno()
+        except (AttributeError, ValueError, io.UnsupportedOperation) :
+            shutil.copyfileobj(infile, self.wfile, 65536)
+            return
+        offset = 0
+        while offset < size :
+            sent = sendfile(out, infile.fileno(), offset, size - offset)
+            if not sent :
+                break
+            offset += sent
+    def cached (self, etag) :
+        match = self.headers.get("If-None-Match", "")
+        return match.strip() == "*" or etag in [m.strip()
+                                               for m in match.split(",")]
+    def compress (self, content_type, data) :
+        if len(data) < self.gzipmin :
+            return False
+        elif not (content_type.startswith("text/")
+                  or content_type in self.gziptypes) :
+            return False
+        accept = self.headers.get("Accept-Encoding", "")
+        return "gzip" in [e.split(";", 1)[0].strip().lower()
+                          for e in accept.split(",")]
     def log_request (self, code="-", size="-") :
         code = str(code or "-")
         method, path, version = self.requestline.split()
@@ -190,14 +312,12 @@ class HTTPRequestHandler (BaseHTTPServer.BaseHTTPRequestHandler) :
     def log_error (self, format, *args) :
         log.error(format % args, "httpd")
 
-class HTTPServer (BaseHTTPServer.HTTPServer):
+class HTTPServer (socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
     def __init__ (self, server_address, root):
         BaseHTTPServer.HTTPServer.__init__(self, server_address,
                                            HTTPRequestHandler)
         self.root = root
-        self.key = "".join(base64.b64encode(
-            "".join(chr(random.getrandbits(8)) for i in range(15)),
-            "-_").split())
+        self.key = base64.urlsafe_b64encode(os.urandom(15)).decode("ascii")
     def __getitem__ (self, path) :
         try :
             key, path = path.lstrip("/").split("/", 1)
@@ -38,6 +38,8 @@ modules = ["snakes",
            "snakes.plugins.clusters",
            "snakes.plugins.labels",
            "snakes.utils.abcd.build",
+           "snakes.utils.ctlstar.build",
+           "snakes.utils.apidoc",
            ]
 
 stop = False
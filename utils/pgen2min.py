@@ -3,47 +3,66 @@
 Usage: python pgen2min.py INFILE
 """
 
-import sys, string, os.path
+import sys, os.path
 import snakes.lang.pgen as pgen
 import collections
 
+try :
+    from sys import intern
+except ImportError :
+    pass
+
 if len(sys.argv) < 2 :
     print("Usage: python pgen2dot.py INFILE")
     sys.exit(1)
 
-root = None
 nodes = set()
 edges = collections.defaultdict(set)
 
-def walk (st, lex, rule=None) :
-    global root
-    tok, children = st
-    if tok == pgen.PgenParser.RULE :
-        rule = children[0][0]
-        if root is None :
-            root = rule
-        nodes.add(rule)
-        for child in children[1:] :
-            walk(child, lex, rule)
-    elif isinstance(tok, str) and tok.strip() and tok[0] in string.ascii_lowercase :
-        nodes.add(tok)
-        if rule is not None :
-            edges[rule].add(tok)
-    else :
-        for child in children :
-            walk(child, lex, rule)
-
-st, lex = pgen.PgenParser.parse(sys.argv[1])
-walk(st, lex)
-
-reached = set()
-next = set([root])
-while not next.issubset(reached) :
-    reached.update(next)
-    prev = next
-    next = set()
-    for n in prev :
-        next.update(edges[n])
-
-for node in sorted(nodes - reached) :
-    print(node)
+def walk (st) :
+    root = None
+    RULE = pgen.PgenParser.RULE
+    stack = [(st, None)]
+    while stack :
+        (tok, children), rule = stack.pop()
+        if tok == RULE :
+            rule = intern(str(children[0][0]))
+            if root is None :
+                root = rule
+            nodes.add(rule)
+            stack.extend((child, rule) for child in reversed(children[1:]))
+        elif isinstance(tok, str) and tok.strip() and "a" <= tok[0] <= "z" :
+            tok = intern(str(tok))
+            nodes.add(tok)
+            if rule is not None :
+                edges[rule].add(tok)
+        else :
+            stack.extend((child, rule) for child in reversed(children))
+    return root
+
+root = walk(pgen.PgenParser.parse(sys.argv[1])[0])
+
+names = sorted(nodes)
+index = dict((name, num) for num, name in enumerate(names))
+indptr = [0]
+neighbours = []
+for name in names :
+    neighbours.extend(index[n] for n in edges.get(name, ()))
+    indptr.append(len(neighbours))
+
+reached = bytearray(len(names))
+queue = collections.deque()
+if root is not None :
+    reached[index[root]] = 1
+    queue.append(index[root])
+missing = len(names) - len(queue)
+while queue and missing :
+    num = queue.popleft()
+    for n in neighbours[indptr[num]:indptr[num+1]] :
+        if not reached[n] :
+            reached[n] = 1
+            missing -= 1
+            queue.append(n)
+
+sys.stdout.write("".join("%s\n" % name for num, name in enumerate(names)
+                         if not reached[num]))
@@ -1,9 +1,10 @@
-import sys, os
+import sys
 sys.path.insert(0, ".")
 import snakes
 
 def check () :
-    VERSION = open("VERSION").read().strip()
+    with open("VERSION") as infile :
+        VERSION = infile.read().strip()
     if VERSION == snakes.version :
         sys.exit(0)
     else :
@@ -17,7 +18,13 @@ def next () :
     new = ".".join(str(v) for v in ver)
     with open("VERSION", "w") as out :
         out.write("%s\n" % new)
-    os.system("sed -i.bak 's/%s/%s/' snakes/__init__.py" % (old, new))
+    with open("snakes/__init__.py") as infile :
+        src = infile.read()
+    with open("snakes/__init__.py.bak", "w") as out :
+        out.write(src)
+    with open("snakes/__init__.py", "w") as out :
+        out.write("".join(line.replace(old, new, 1)
+                          for line in src.splitlines(True)))
 
 if __name__ == "__main__" :
     if sys.argv[1:] == ["check"] :